@@ -39,7 +39,7 @@ LIBAPI = 0
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version.
-LIBPATCH = 7
+LIBPATCH = 8
 
 logger = logging.getLogger(__name__)
 
@@ -134,8 +134,12 @@ class RedisProvides(Object):
 
     def _on_relation_changed(self, event):
         """Handle the relation changed event."""
-        event.relation.data[self.model.unit]["hostname"] = self._get_master_ip()
-        event.relation.data[self.model.unit]["port"] = str(self._port)
+        unit_data = event.relation.data[self.model.unit]
+        fields = {"hostname": self._get_master_ip(), "port": str(self._port)}
+        # Every write runs relation-set, so only send the values that changed.
+        for key, value in fields.items():
+            if unit_data.get(key) != value:
+                unit_data[key] = value
         # The reactive Redis charm also exposes 'password'. When tackling
         # https://github.com/canonical/redis-k8s/issues/7 add 'password'
         # field so that it matches the exposed interface information from it.
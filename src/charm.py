@@ -4,26 +4,40 @@
 
 """Charm code for Redis service."""
 
+import hashlib
+import json
 import logging
+import random
 import secrets
 import socket
 import string
+import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
+from functools import cached_property
+from itertools import repeat
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from charms.grafana_k8s.v0.grafana_dashboard import GrafanaDashboardProvider
 from charms.loki_k8s.v0.loki_push_api import LogProxyConsumer
 from charms.prometheus_k8s.v0.prometheus_scrape import MetricsEndpointProvider
 from charms.redis_k8s.v0.redis import RedisProvides
 from ops.charm import ActionEvent, CharmBase, UpgradeCharmEvent
-from ops.framework import EventBase
+from ops.framework import EventBase, StoredState
 from ops.main import main
-from ops.model import ActiveStatus, BlockedStatus, ModelError, Relation, WaitingStatus
-from ops.pebble import ExecError, Layer
+from ops.model import (
+    ActiveStatus,
+    BlockedStatus,
+    Container,
+    ModelError,
+    Relation,
+    RelationDataContent,
+    WaitingStatus,
+)
+from ops.pebble import ExecError, Layer, Plan
 from redis import ConnectionError, Redis, TimeoutError
 from redis.exceptions import RedisError
-from tenacity import before_log, retry, stop_after_attempt, wait_fixed
 
 from literals import (
     LEADER_HOST_KEY,
@@ -44,6 +58,43 @@ from sentinel import Sentinel
 
 logger = logging.getLogger(__name__)
 
+PASSWORD_ALPHABET = string.ascii_letters + string.digits
+
+# redis-server flags that can be changed on a running server, without a restart
+RUNTIME_REDIS_FLAGS = frozenset({"replica-announce-ip", "replicaof"})
+
+# redis-server flags enabling TLS, formatted once with the storage path of the certificates
+TLS_FLAGS_TEMPLATE = (
+    "--tls-port {port} --port 0 --tls-auth-clients optional"
+    " --tls-cert-file {storage}/redis.crt"
+    " --tls-key-file {storage}/redis.key"
+    " --tls-ca-cert-file {storage}/ca.crt"
+)
+
+# Static part of the Redis Pebble layer. The redis-server command and the exporter
+# password are filled in by `RedisK8sCharm._redis_layer`.
+REDIS_LAYER_TEMPLATE = {
+    "summary": "Redis layer",
+    "description": "Redis layer",
+    "services": {
+        "redis": {
+            "override": "replace",
+            "summary": "Redis service",
+            "user": REDIS_USER,
+            "group": REDIS_USER,
+            "startup": "enabled",
+        },
+        "redis_exporter": {
+            "override": "replace",
+            "summary": "Redis metric exporter",
+            "command": "bin/redis_exporter",
+            "user": REDIS_USER,
+            "group": REDIS_USER,
+            "startup": "enabled",
+        },
+    },
+}
+
 
 class RedisK8sCharm(CharmBase):
     """Charm the service.
@@ -52,8 +103,11 @@ class RedisK8sCharm(CharmBase):
     point to the service.
     """
 
+    _stored = StoredState()
+
     def __init__(self, *args):
         super().__init__(*args)
+        self._stored.set_default(redis_layer_hash="")
 
         self._unit_name = self.unit.name
         self._name = self.model.app.name
@@ -96,12 +150,19 @@ class RedisK8sCharm(CharmBase):
         )
 
         self._storage_path = self.meta.storages["database"].location
+        self._tls_flags = TLS_FLAGS_TEMPLATE.format(port=REDIS_PORT, storage=self._storage_path)
+        self._redis_clients: Dict[Tuple, Redis] = {}
+        self._last_layer_inputs: Optional[Tuple] = None
 
     def _redis_pebble_ready(self, event) -> None:
         """Handle the pebble_ready event.
 
         Updates the Pebble layer if needed.
         """
+        # The container might have been restarted, losing the previous Pebble plan
+        self._stored.redis_layer_hash = ""
+        self._last_layer_inputs = None
+
         self._store_certificates()
         self._update_layer()
 
@@ -111,10 +172,11 @@ class RedisK8sCharm(CharmBase):
             return
         # In the event of a pod restart on the same node the upgrade event is not fired.
         # The IP might change, so the data needs to be propagated
-        for relation in self.model.relations[REDIS_REL_NAME]:
-            relation.data[self.model.unit]["hostname"] = socket.gethostbyname(
-                self.unit_pod_hostname
-            )
+        relations = self.model.relations[REDIS_REL_NAME]
+        if relations:
+            unit_ip = socket.gethostbyname(self.unit_pod_hostname)
+            for relation in relations:
+                relation.data[self.model.unit]["hostname"] = unit_ip
 
     def _upgrade_charm(self, event: UpgradeCharmEvent) -> None:
         """Handle the upgrade_charm event.
@@ -133,15 +195,16 @@ class RedisK8sCharm(CharmBase):
             # during those process, the leader-elected and any relation events are not emitted.
             # It's the responsibility of upgrade-charm handler to update relation data in the
             # case of the single unit deployment.
-            self._peers.data[self.app][LEADER_HOST_KEY] = self.unit_pod_hostname
-            for relation in self.model.relations[REDIS_REL_NAME]:
-                relation.data[self.model.unit]["hostname"] = socket.gethostbyname(
-                    self.unit_pod_hostname
-                )
+            self._app_data[LEADER_HOST_KEY] = self.unit_pod_hostname
+            relations = self.model.relations[REDIS_REL_NAME]
+            if relations:
+                unit_ip = socket.gethostbyname(self.unit_pod_hostname)
+                for relation in relations:
+                    relation.data[self.model.unit]["hostname"] = unit_ip
             return
 
         # Pick a different unit to connect to sentinel
-        k8s_host = self._k8s_hostname(name=list(self._peers.units)[0].name)
+        k8s_host = self._k8s_hostname(name=next(iter(self._peers.units)).name)
         if not self._is_failover_finished(host=k8s_host):
             logger.info("Failover didn't finish, deferring")
             event.defer()
@@ -153,9 +216,9 @@ class RedisK8sCharm(CharmBase):
         # triggers for the leader unit and application databag is updated.
         if self.unit.is_leader():
             info = self.sentinel.get_master_info(host=k8s_host)
-            logger.debug(f"Master info: {info}")
-            logger.info(f"Unit {self.unit.name} updating master info to {info['ip']}")
-            self._peers.data[self.app][LEADER_HOST_KEY] = info["ip"]
+            logger.debug("Master info: %s", info)
+            logger.info("Unit %s updating master info to %s", self.unit.name, info["ip"])
+            self._app_data[LEADER_HOST_KEY] = info["ip"]
         else:
             relations = self.model.relations[REDIS_REL_NAME]
             if relations:
@@ -171,11 +234,11 @@ class RedisK8sCharm(CharmBase):
         """
         if not self._get_password():
             logger.info("Creating password for application")
-            self._peers.data[self.app][PEER_PASSWORD_KEY] = self._generate_password()
+            self._app_data[PEER_PASSWORD_KEY] = self._generate_password()
 
         if not self.get_sentinel_password():
             logger.info("Creating sentinel password")
-            self._peers.data[self.app][SENTINEL_PASSWORD_KEY] = self._generate_password()
+            self._app_data[SENTINEL_PASSWORD_KEY] = self._generate_password()
         # NOTE: if current_master is not set yet, the application is being deployed for the
         # first time. Otherwise, we check for failover in case previous juju leader was redis
         # master as well.
@@ -183,7 +246,7 @@ class RedisK8sCharm(CharmBase):
             logger.info(
                 "Initial replication, setting leader-host to {}".format(self.unit_pod_hostname)
             )
-            self._peers.data[self.app][LEADER_HOST_KEY] = self.unit_pod_hostname
+            self._app_data[LEADER_HOST_KEY] = self.unit_pod_hostname
         else:
             # TODO extract to method shared with relation_departed
             self._update_application_master()
@@ -208,6 +271,7 @@ class RedisK8sCharm(CharmBase):
             self.unit.status = BlockedStatus("Not enough certificates found")
             return
 
+        self._store_certificates()
         self._update_layer()
         self.sentinel._update_sentinel_layer()
 
@@ -230,6 +294,7 @@ class RedisK8sCharm(CharmBase):
 
     def _peer_relation_changed(self, event):
         """Handle relation for joining units."""
+        is_leader = self.unit.is_leader()
         if not self._master_up_to_date():
             logger.error(f"Unit {self.unit.name} doesn't agree on tracked master")
             if not self._is_failover_finished():
@@ -237,25 +302,24 @@ class RedisK8sCharm(CharmBase):
                 event.defer()
                 return
 
-            if self.unit.is_leader():
+            if is_leader:
                 # Update who the current master is
                 self._update_application_master()
 
         # (DEPRECATE) If legacy relation exists, layer might need to be
         # reconfigured to remove auth
-        if self._peers.data[self.app].get("enable-password", "true") == "false":
+        if self._password_disabled:
             self._update_layer()
 
         relations = self.model.relations[REDIS_REL_NAME]
         if relations:
+            unit_ip = socket.gethostbyname(self.unit_pod_hostname)
             for relation in relations:
-                relation.data[self.model.unit]["hostname"] = socket.gethostbyname(
-                    self.unit_pod_hostname
-                )
+                relation.data[self.model.unit]["hostname"] = unit_ip
             if self._peers.data[self.unit].get("upgrading", "false") == "true":
                 self._peers.data[self.unit]["upgrading"] = ""
 
-        if not (self.unit.is_leader() and event.unit):
+        if not (is_leader and event.unit):
             return
 
         if not self.sentinel.in_majority:
@@ -308,9 +372,14 @@ class RedisK8sCharm(CharmBase):
         if not self.unit.is_leader():
             return
 
-        self._peers.data[self.app]["enable-password"] = "false"
-        if self.current_master:
-            event.relation.data[self.app][LEADER_HOST_KEY] = self.current_master
+        # NOTE: ops runs relation-set for every write, even if the value is unchanged,
+        # so the application databags are only written when a value differs.
+        if not self._password_disabled:
+            self._app_data["enable-password"] = "false"
+        current_master = self.current_master
+        relation_app_data = event.relation.data[self.app]
+        if current_master and relation_app_data.get(LEADER_HOST_KEY) != current_master:
+            relation_app_data[LEADER_HOST_KEY] = current_master
 
         self._update_layer()
 
@@ -337,34 +406,135 @@ class RedisK8sCharm(CharmBase):
             self.unit.status = WaitingStatus("Waiting for peer data to be updated")
             return
 
-        # Get current config
-        current_layer = container.get_plan()
+        # Nothing that goes into the layer changed since it was last applied in this hook
+        layer_inputs = self._layer_inputs()
+        if layer_inputs == self._last_layer_inputs:
+            self.unit.status = ActiveStatus()
+            return
 
         # Create the new config layer
         new_layer = self._redis_layer()
+        layer_hash = hashlib.blake2b(
+            json.dumps(new_layer.to_dict(), sort_keys=True).encode(), digest_size=16
+        ).hexdigest()
+
+        # NOTE: the hash of the last applied layer is kept across hooks, so the plan
+        # is only fetched from Pebble when the layer changed. It is reset on
+        # pebble-ready, since a restarted container comes back with an empty plan.
+        if layer_hash != self._stored.redis_layer_hash:
+            # Get current config
+            current_layer = container.get_plan()
+
+            # Update the Pebble configuration Layer
+            if current_layer.services != new_layer.services:
+                container.add_layer("redis", new_layer, combine=True)
+                logger.info("Added updated layer 'redis' to Pebble plan")
+                if self._reconfigure_redis(current_layer, new_layer):
+                    logger.info("Applied updated configuration to the running redis service")
+                else:
+                    container.restart("redis", "redis_exporter")
+                    logger.info("Restarted redis and redis_exporter services")
+
+            self._stored.redis_layer_hash = layer_hash
+
+        self._last_layer_inputs = layer_inputs
+        self.unit.status = ActiveStatus()
 
-        # Update the Pebble configuration Layer
-        if current_layer.services != new_layer.services:
-            container.add_layer("redis", new_layer, combine=True)
-            logger.info("Added updated layer 'redis' to Pebble plan")
-            container.restart("redis", "redis_exporter")
-            logger.info("Restarted redis and redis_exporter services")
+    def _reconfigure_redis(self, current_layer: Plan, new_layer: Layer) -> bool:
+        """Apply a change of the redis-server flags without restarting the service.
 
-        self.unit.status = ActiveStatus()
+        Only flags that Redis can change at runtime are applied, any other change
+        (e.g. passwords or TLS) still needs a restart of the services.
+
+        Args:
+            current_layer: the Pebble plan currently in use by the container
+            new_layer: the layer that has just been added to the plan
+
+        Returns:
+            True if the running server was reconfigured, False if a restart is needed
+        """
+        current_services = current_layer.services
+        new_services = new_layer.services
+        current = current_services.get("redis")
+        new = new_services["redis"]
+        if (
+            current is None
+            or current_services.get("redis_exporter") != new_services["redis_exporter"]
+        ):
+            return False
+        if {**current.to_dict(), "command": ""} != {**new.to_dict(), "command": ""}:
+            return False
+
+        current_flags = self._parse_redis_flags(current.command)
+        new_flags = self._parse_redis_flags(new.command)
+        changed = {
+            flag
+            for flag in current_flags.keys() | new_flags.keys()
+            if current_flags.get(flag) != new_flags.get(flag)
+        }
+        if not changed or not changed <= RUNTIME_REDIS_FLAGS:
+            return False
+
+        try:
+            with self._redis_client() as redis:
+                if "replica-announce-ip" in changed:
+                    redis.config_set("replica-announce-ip", new_flags["replica-announce-ip"])
+                if "replicaof" in changed:
+                    if "replicaof" in new_flags:
+                        redis.replicaof(*new_flags["replicaof"].split())
+                    else:
+                        redis.replicaof("NO", "ONE")
+        except RedisError as e:
+            logger.warning(f"Could not reconfigure running redis: {e}")
+            return False
+
+        return True
+
+    @staticmethod
+    def _parse_redis_flags(command: str) -> Dict[str, str]:
+        """Split a redis-server command into its flags.
+
+        Args:
+            command: the command of the redis service, e.g. "redis-server --dir /data"
+
+        Returns:
+            A dictionary mapping every flag name to its value
+        """
+        flags = {}
+        for flag in command.split(" --")[1:]:
+            name, _, value = flag.partition(" ")
+            flags[name] = value
+        return flags
+
+    def _layer_inputs(self) -> Tuple:
+        """Collect the values the Redis Pebble layer is built from.
+
+        Returns:
+            A tuple that changes whenever the layer returned by `_redis_layer` would change
+        """
+        return (
+            self._get_password(),
+            self.config["enable-tls"],
+            self.current_master,
+            self.unit_pod_hostname,
+            self._app_data.get("enable-password"),
+        )
 
     def _initialize_directory_structure(self) -> None:
         """Make sure all required directories for redis are available on startup."""
         container = self.unit.get_container("redis")
 
-        if not container.exists(LOG_DIR):
-            container.make_dir(
-                LOG_DIR,
-                make_parents=True,
-                permissions=0o770,
-                user=REDIS_USER,
-                group=REDIS_USER,
-            )
+        # NOTE: creating the directory with `make_parents` is a no-op if it already exists
+        container.make_dir(
+            LOG_DIR,
+            make_parents=True,
+            permissions=0o770,
+            user=REDIS_USER,
+            group=REDIS_USER,
+        )
 
+        # The existence check is kept here, since it decides if the ownership of the
+        # data files needs to be fixed.
         if not container.exists(WORKING_DIR):
             container.make_dir(
                 WORKING_DIR,
@@ -385,83 +555,96 @@ class RedisK8sCharm(CharmBase):
         Returns:
             A `ops.pebble.Layer` object with the current layer options
         """
+        password = self._get_password()
+        extra_flags = self._redis_extra_flags(
+            password=password,
+            enable_password=not self._password_disabled,
+            tls=self.config["enable-tls"],
+            master=self.current_master,
+            hostname=self.unit_pod_hostname,
+        )
+        services = REDIS_LAYER_TEMPLATE["services"]
         layer_config = {
-            "summary": "Redis layer",
-            "description": "Redis layer",
+            **REDIS_LAYER_TEMPLATE,
             "services": {
                 "redis": {
-                    "override": "replace",
-                    "summary": "Redis service",
-                    "command": f"redis-server {self._redis_extra_flags()}",
-                    "user": REDIS_USER,
-                    "group": REDIS_USER,
-                    "startup": "enabled",
+                    **services["redis"],
+                    "command": f"redis-server {extra_flags}",
                 },
                 "redis_exporter": {
-                    "override": "replace",
-                    "summary": "Redis metric exporter",
-                    "command": "bin/redis_exporter",
-                    "user": REDIS_USER,
-                    "group": REDIS_USER,
-                    "startup": "enabled",
+                    **services["redis_exporter"],
                     "environment": {
-                        "REDIS_PASSWORD": self._get_password(),
+                        "REDIS_PASSWORD": password,
                     },
                 },
             },
         }
         return Layer(layer_config)
 
-    def _redis_extra_flags(self) -> str:
+    def _redis_extra_flags(
+        self,
+        password: Optional[str],
+        enable_password: bool,
+        tls: bool,
+        master: Optional[str],
+        hostname: str,
+    ) -> str:
         """Generate the REDIS_EXTRA_FLAGS environment variable for the container.
 
-        Will check config options to decide the extra commands passed at the
-        redis-server service.
-        """
-        extra_flags = [
-            f"--requirepass {self._get_password()}",
-            "--bind 0.0.0.0",
-            f"--masterauth {self._get_password()}",
-            f"--replica-announce-ip {self.unit_pod_hostname}",
-            f"--logfile {LOG_FILE}",
-            "--appendonly yes",
-            f"--dir {WORKING_DIR}",
-        ]
+        The flags only depend on the arguments, which are read once by the caller
+        from the config options and the peer databag.
 
-        if self._peers.data[self.app].get("enable-password", "true") == "false":
+        Args:
+            password: the admin password for Redis, as returned by `_get_password`.
+            enable_password: False if the (deprecated) legacy relation disabled auth.
+            tls: whether TLS is enabled.
+            master: hostname of the current Redis master.
+            hostname: hostname of this unit.
+        """
+        if enable_password:
+            extra_flags = [
+                f"--requirepass {password}",
+                "--bind 0.0.0.0",
+                f"--masterauth {password}",
+                f"--replica-announce-ip {hostname}",
+            ]
+        else:
             logger.warning(
                 "DEPRECATION WARNING - password off, this will be removed on later versions"
             )
             extra_flags = [
                 "--bind 0.0.0.0",
-                f"--replica-announce-ip {self.unit_pod_hostname}",
+                f"--replica-announce-ip {hostname}",
                 "--protected-mode no",
-                f"--logfile {LOG_FILE}",
-                "--appendonly yes",
-                f"--dir {WORKING_DIR}",
             ]
 
-        if self.config["enable-tls"]:
-            extra_flags += [
-                f"--tls-port {REDIS_PORT}",
-                "--port 0",
-                "--tls-auth-clients optional",
-                f"--tls-cert-file {self._storage_path}/redis.crt",
-                f"--tls-key-file {self._storage_path}/redis.key",
-                f"--tls-ca-cert-file {self._storage_path}/ca.crt",
-            ]
+        extra_flags += [
+            f"--logfile {LOG_FILE}",
+            "--appendonly yes",
+            f"--dir {WORKING_DIR}",
+        ]
+
+        if tls:
+            extra_flags.append(self._tls_flags)
 
         # Check that current unit is master
-        if self.current_master != self.unit_pod_hostname:
-            extra_flags += [f"--replicaof {self.current_master} {REDIS_PORT}"]
+        if master != hostname:
+            extra_flags += [f"--replicaof {master} {REDIS_PORT}"]
 
-            if self.config["enable-tls"]:
+            if tls:
                 extra_flags += ["--tls-replication yes"]
 
         return " ".join(extra_flags)
 
     def _redis_check(self) -> None:
         """Checks if the Redis database is active."""
+        # Avoid waiting for the socket timeout if the workload container is not up
+        if not self.unit.get_container("redis").can_connect():
+            self.unit.status = WaitingStatus(WAITING_MESSAGE)
+            if self.unit.is_leader():
+                self.app.status = WaitingStatus(WAITING_MESSAGE)
+            return False
+
         try:
             with self._redis_client() as redis:
                 info = redis.info("server")
@@ -515,9 +698,21 @@ class RedisK8sCharm(CharmBase):
         return self.model.get_relation(PEER)
 
     @property
+    def _app_data(self) -> RelationDataContent:
+        """Fetch the application databag of the peer relation.
+
+        Returns:
+            An `ops.model.RelationDataContent` object with the peer application data.
+        """
+        return self._peers.data[self.app]
+
+    @cached_property
     def _certificates(self) -> List[Optional[Path]]:
         """Paths of the certificate files.
 
+        Resources are fetched once per hook, since a new charm instance is created
+        for every event dispatched by Juju.
+
         Returns:
             A list with the paths of the certificates or None where no path can be found
         """
@@ -525,14 +720,50 @@ class RedisK8sCharm(CharmBase):
         return [self._retrieve_resource(res) for res in resources]
 
     @property
-    def unit_pod_hostname(self, name="") -> str:
-        """Creates the pod hostname from its name."""
-        return socket.getfqdn(name)
+    def unit_pod_hostname(self) -> str:
+        """Creates the pod hostname from its name.
+
+        The hostname is built the same way as the one of the peer units, instead
+        of resolving the FQDN of the pod through DNS.
+        """
+        return self._k8s_hostname(self._unit_name)
+
+    @cached_property
+    def _ca_cert_path(self) -> Optional[Path]:
+        """Path of the CA certificate file, fetched once per hook.
+
+        Returns:
+            Path of the CA certificate or None if the resource is not available
+        """
+        return self._retrieve_resource("ca-cert-file")
+
+    @cached_property
+    def _sentinel_hostnames(self) -> List[str]:
+        """Hostnames of all the sentinel instances, including the one of this unit.
+
+        Peer units do not change during a hook, so the list is only built once.
+
+        Returns:
+            A list with the hostnames of every unit in the application
+        """
+        hostnames = [self._k8s_hostname(unit.name) for unit in self._peers.units]
+        # Add the own unit
+        hostnames.append(self.unit_pod_hostname)
+        return hostnames
+
+    @property
+    def _password_disabled(self) -> bool:
+        """Check if the (deprecated) legacy relation disabled authentication.
+
+        Returns:
+            True if Redis runs without a password, False otherwise
+        """
+        return self._app_data.get("enable-password", "true") == "false"
 
     @property
     def current_master(self) -> Optional[str]:
         """Get the current master."""
-        return self._peers.data[self.app].get(LEADER_HOST_KEY)
+        return self._app_data.get(LEADER_HOST_KEY)
 
     def _valid_app_databag(self) -> bool:
         """Check if the peer databag has been populated.
@@ -540,12 +771,9 @@ class RedisK8sCharm(CharmBase):
         Returns:
             bool: True if the databag has been populated, false otherwise
         """
-        password = self._get_password()
-
         # NOTE: (DEPRECATE) Only used for the redis legacy relation. The password
         # is not relevant when that relation is used
-        if self._peers.data[self.app].get("enable-password", "true") == "false":
-            password = True
+        password = True if self._password_disabled else self._app_data.get(PEER_PASSWORD_KEY)
 
         return bool(password and self.current_master)
 
@@ -555,9 +783,18 @@ class RedisK8sCharm(CharmBase):
         Returns:
            A random password string.
         """
-        choices = string.ascii_letters + string.digits
-        password = "".join([secrets.choice(choices) for i in range(16)])
-        return password
+        # NOTE: random bytes are drawn in batches instead of one CSPRNG call per
+        # character. Bytes above the largest multiple of the alphabet length are
+        # dropped so the modulo does not bias the password towards the first characters.
+        limit = 256 - (256 % len(PASSWORD_ALPHABET))
+        password = ""
+        while len(password) < 16:
+            password += "".join(
+                PASSWORD_ALPHABET[byte % len(PASSWORD_ALPHABET)]
+                for byte in secrets.token_bytes(32)
+                if byte < limit
+            )
+        return password[:16]
 
     def _get_password(self) -> Optional[str]:
         """Get the current admin password for Redis.
@@ -565,12 +802,11 @@ class RedisK8sCharm(CharmBase):
         Returns:
             String with the password
         """
-        data = self._peers.data[self.app]
         # NOTE: (DEPRECATE) When using redis legacy relation, no password is used
-        if data.get("enable-password", "true") == "false":
+        if self._password_disabled:
             return None
 
-        return data.get(PEER_PASSWORD_KEY)
+        return self._app_data.get(PEER_PASSWORD_KEY)
 
     def get_sentinel_password(self) -> Optional[str]:
         """Get the current password for sentinel.
@@ -578,27 +814,56 @@ class RedisK8sCharm(CharmBase):
         Returns:
             String with the password
         """
-        data = self._peers.data[self.app]
-        return data.get(SENTINEL_PASSWORD_KEY)
+        return self._app_data.get(SENTINEL_PASSWORD_KEY)
 
     def _store_certificates(self) -> None:
-        """Copy the TLS certificates to the redis container."""
+        """Copy the TLS certificates to the redis container.
+
+        Nothing is copied while TLS is disabled, `_config_changed` stores the
+        certificates once it gets enabled. Nothing is copied either while Pebble
+        is not reachable, pebble-ready stores the certificates once it is up.
+        """
+        if not self.config["enable-tls"]:
+            return
+
         # Get a list of valid paths
         cert_paths = list(filter(None, self._certificates))
+        if not cert_paths:
+            return
+
         container = self.unit.get_container("redis")
+        if not container.can_connect():
+            logger.warning("Can't connect to redis container, certificates not stored")
+            return
+
+        container.make_dir(
+            self._storage_path,
+            make_parents=True,
+            permissions=0o770,
+            user=REDIS_USER,
+            group=REDIS_USER,
+        )
 
         # Copy the files from the resources location to the redis container.
         # TODO handle error case
-        for cert_path in cert_paths:
-            with open(cert_path, "r") as f:
-                container.push(
-                    (f"{self._storage_path}/{cert_path.name}"),
-                    f,
-                    make_dirs=True,
-                    permissions=0o600,
-                    user="redis",
-                    group="redis",
-                )
+        with ThreadPoolExecutor(max_workers=len(cert_paths)) as executor:
+            list(executor.map(self._push_certificate, repeat(container), cert_paths))
+
+    def _push_certificate(self, container: Container, cert_path: Path) -> None:
+        """Push a single certificate file to the storage path of a container.
+
+        Args:
+            container: the container to push the certificate to
+            cert_path: path of the certificate file on the charm container
+        """
+        with open(cert_path, "rb") as f:
+            container.push(
+                (f"{self._storage_path}/{cert_path.name}"),
+                f,
+                permissions=0o600,
+                user="redis",
+                group="redis",
+            )
 
     def _retrieve_resource(self, resource: str) -> Optional[Path]:
         """Check that the resource exists and return it.
@@ -622,32 +887,45 @@ class RedisK8sCharm(CharmBase):
         Returns:
             A string representing the hostname of the Redis unit.
         """
-        unit_id = name.split("/")[1]
+        unit_id = name.rpartition("/")[2]
         return f"{self._name}-{unit_id}.{self._name}-endpoints.{self._namespace}.svc.cluster.local"
 
     @contextmanager
     def _redis_client(self, hostname="localhost") -> Redis:
         """Creates a Redis client on a given hostname.
 
-        All parameters are passed, will default to the same values under `Redis` constructor
+        All parameters are passed, will default to the same values under `Redis` constructor.
+        Clients are kept for the rest of the hook, so the connections in their pool are
+        reused by later calls with the same hostname and connection settings.
 
         Returns:
             Redis: redis client
         """
-        ca_cert_path = self._retrieve_resource("ca-cert-file")
-        client = Redis(
-            host=hostname,
-            port=REDIS_PORT,
-            password=self._get_password(),
-            ssl=self.config["enable-tls"],
-            ssl_ca_certs=ca_cert_path,
-            decode_responses=True,
-            socket_timeout=SOCKET_TIMEOUT,
-        )
+        ca_cert_path = self._ca_cert_path
+        password = self._get_password()
+        tls = self.config["enable-tls"]
+
+        key = (hostname, password, tls, ca_cert_path)
+        client = self._redis_clients.get(key)
+        if client is None:
+            client = Redis(
+                host=hostname,
+                port=REDIS_PORT,
+                password=password,
+                ssl=tls,
+                ssl_ca_certs=ca_cert_path,
+                decode_responses=True,
+                socket_timeout=SOCKET_TIMEOUT,
+            )
+            self._redis_clients[key] = client
+
         try:
             yield client
-        finally:
-            client.close()
+        except RedisError:
+            # Do not hand a client in an unknown state to later calls
+            del self._redis_clients[key]
+            client.connection_pool.disconnect()
+            raise
 
     def _master_up_to_date(self, host="0.0.0.0") -> bool:
         """Check if stored master is the same as sentinel tracked.
@@ -666,13 +944,13 @@ class RedisK8sCharm(CharmBase):
     def _update_application_master(self) -> None:
         """Use Sentinel to update the current master hostname."""
         info = self.sentinel.get_master_info()
-        logger.debug(f"Master info: {info}")
+        logger.debug("Master info: %s", info)
         if info is None:
             logger.warning("Could not update current master")
             return
 
-        logger.info(f"Unit {self.unit.name} updating master info to {info['ip']}")
-        self._peers.data[self.app][LEADER_HOST_KEY] = info["ip"]
+        logger.info("Unit %s updating master info to %s", self.unit.name, info["ip"])
+        self._app_data[LEADER_HOST_KEY] = info["ip"]
 
         for relation in self.model.relations.get(REDIS_REL_NAME):
             relation.data[self.app][LEADER_HOST_KEY] = info["ip"]
@@ -690,15 +968,32 @@ class RedisK8sCharm(CharmBase):
         with self.sentinel.sentinel_client() as sentinel:
             sentinel.execute_command(f"SENTINEL FAILOVER {self._name}")
 
-    @retry(
-        stop=stop_after_attempt(4),
-        wait=wait_fixed(15),
-        reraise=True,
-        before=before_log(logger, logging.DEBUG),
-    )
     def _is_failover_finished(self, host="localhost") -> bool:
         """Check if failover is still in progress.
 
+        Errors raised while querying sentinel are retried, up to 5 attempts with an
+        exponential backoff (0.5s doubling up to 4s) plus up to 0.5s of random jitter,
+        so units do not retry in lockstep. The last error is raised if every attempt
+        fails.
+
+        Args:
+            host: string to connect to sentinel.
+
+        Returns:
+            True if failover is finished, false otherwise
+        """
+        for attempt in range(1, 6):
+            logger.debug("Checking failover status, attempt %s", attempt)
+            try:
+                return self._check_failover_status(host)
+            except Exception:
+                if attempt == 5:
+                    raise
+                time.sleep(min(0.5 * 2 ** (attempt - 1), 4) + random.uniform(0, 0.5))
+
+    def _check_failover_status(self, host: str) -> bool:
+        """Query sentinel once to check if failover is still in progress.
+
         Args:
             host: string to connect to sentinel.
 
@@ -734,17 +1029,35 @@ class RedisK8sCharm(CharmBase):
         Args:
             command: string with the command to broadcast to all sentinels
         """
-        hostnames = [self._k8s_hostname(unit.name) for unit in self._peers.units]
-        # Add the own unit
-        hostnames.append(self.unit_pod_hostname)
+        hostnames = self._sentinel_hostnames
+        # The ops model is not thread-safe, so it is only read before the fan-out
+        password = self.get_sentinel_password()
+
+        # NOTE: sentinels are contacted concurrently, so the hook only waits for the
+        # slowest instance instead of the sum of all round-trips.
+        with ThreadPoolExecutor(max_workers=min(32, len(hostnames))) as executor:
+            list(
+                executor.map(
+                    self._send_sentinel_command, hostnames, repeat(command), repeat(password)
+                )
+            )
+
+    def _send_sentinel_command(self, hostname: str, command: str, password: str) -> None:
+        """Send a command to a single sentinel instance.
 
-        for hostname in hostnames:
-            with self.sentinel.sentinel_client(hostname=hostname) as sentinel:
-                try:
-                    logger.debug("Sending {} to sentinel at {}".format(command, hostname))
-                    sentinel.execute_command(command)
-                except (ConnectionError, TimeoutError) as e:
-                    logger.error("Error connecting to instance: {} - {}".format(hostname, e))
+        Runs on worker threads, so it must not access the ops model.
+
+        Args:
+            hostname: string with the hostname of the sentinel instance
+            command: string with the command to send
+            password: the sentinel password
+        """
+        with self.sentinel.sentinel_client(hostname=hostname, password=password) as sentinel:
+            try:
+                logger.debug("Sending %s to sentinel at %s", command, hostname)
+                sentinel.execute_command(command)
+            except (ConnectionError, TimeoutError) as e:
+                logger.error("Error connecting to instance: {} - {}".format(hostname, e))
 
 
 if __name__ == "__main__":  # pragma: nocover
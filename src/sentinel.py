@@ -10,14 +10,16 @@ Sentinel provides high availability for Redis.
 
 import logging
 from contextlib import contextmanager
+from functools import lru_cache
 from math import floor
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
 from jinja2 import Template
 from ops.framework import Object
 from ops.model import ActiveStatus, WaitingStatus
 from ops.pebble import Layer
 from redis import ConnectionError, Redis, ResponseError, TimeoutError
+from redis.exceptions import RedisError
 
 from literals import (
     CONFIG_DIR,
@@ -29,6 +31,22 @@ from literals import (
 
 logger = logging.getLogger(__name__)
 
+SENTINEL_TEMPLATE_PATH = "templates/sentinel.conf.j2"
+
+
+@lru_cache(maxsize=None)
+def _load_template(path: str) -> Template:
+    """Read and compile a Jinja2 template only once per process.
+
+    Args:
+        path: path of the template file, relative to the charm directory
+
+    Returns:
+        The compiled `jinja2.Template`
+    """
+    with open(path, "r") as file:
+        return Template(file.read())
+
 
 class Sentinel(Object):
     """Sentinel class.
@@ -41,6 +59,7 @@ class Sentinel(Object):
         super().__init__(charm, "sentinel")
 
         self.charm = charm
+        self._clients: Dict[Tuple, Redis] = {}
         self.framework.observe(charm.on.sentinel_pebble_ready, self._sentinel_pebble_ready)
 
     def _sentinel_pebble_ready(self, event) -> None:
@@ -74,9 +93,11 @@ class Sentinel(Object):
         # Create the new config layer
         new_layer = self._sentinel_layer()
 
-        # Update the Pebble configuration Layer
-        container.add_layer("sentinel", new_layer, combine=True)
-        container.replan()
+        # Update the Pebble configuration Layer, only if it changed. A replan does not
+        # restart sentinel for a new config file either, so it is skipped as well.
+        if container.get_plan().services != new_layer.services:
+            container.add_layer("sentinel", new_layer, combine=True)
+            container.replan()
 
     def _sentinel_layer(self) -> Layer:
         """Create the Pebble configuration layer for Redis Sentinel.
@@ -102,9 +123,7 @@ class Sentinel(Object):
 
     def _render_sentinel_config_file(self) -> None:
         """Render the Sentinel configuration file."""
-        # open the template file
-        with open("templates/sentinel.conf.j2", "r") as file:
-            template = Template(file.read())
+        template = _load_template(SENTINEL_TEMPLATE_PATH)
         # render the template file with the correct values.
         rendered = template.render(
             hostname=self.charm.unit_pod_hostname,
@@ -157,7 +176,14 @@ class Sentinel(Object):
                 # NOTE: master info from redis comes like a list:
                 # ['key1', 'value1', 'key2', 'value2', ...]
                 # this creates a dictionary in a more readable form.
-                return dict(zip(master_info[::2], master_info[1::2]))
+                pairs = iter(master_info)
+                info = dict(zip(pairs, pairs))
+
+                # Flags come as a comma separated string, e.g. "master,s_down"
+                if "flags" in info:
+                    info["flags"] = frozenset(info["flags"].split(","))
+
+                return info
 
             except (ConnectionError, TimeoutError) as e:
                 logger.error("Error when connecting to sentinel: {}".format(e))
@@ -185,24 +211,43 @@ class Sentinel(Object):
         return majority
 
     @contextmanager
-    def sentinel_client(self, hostname="localhost", timeout=SOCKET_TIMEOUT) -> Redis:
+    def sentinel_client(
+        self, hostname="localhost", timeout=SOCKET_TIMEOUT, password: Optional[str] = None
+    ) -> Redis:
         """Creates a Redis client on a given hostname.
 
+        Clients are kept for the rest of the hook, so later calls to the same
+        sentinel reuse the connections in their pool.
+
         Args:
             hostname: String with the hostname to connect to, defaults to localhost
             timeout: int with the number of seconds for timeout on connection
+            password: the sentinel password, read from the peer databag if not given.
+                Callers running on worker threads must pass it, since the ops model
+                is not thread-safe.
 
         Returns:
             Redis: redis client connected to a sentinel instance
         """
-        client = Redis(
-            host=hostname,
-            port=SENTINEL_PORT,
-            password=self.charm.get_sentinel_password(),
-            socket_timeout=timeout,
-            decode_responses=True,
-        )
+        if password is None:
+            password = self.charm.get_sentinel_password()
+
+        key = (hostname, password, timeout)
+        client = self._clients.get(key)
+        if client is None:
+            client = Redis(
+                host=hostname,
+                port=SENTINEL_PORT,
+                password=password,
+                socket_timeout=timeout,
+                decode_responses=True,
+            )
+            self._clients[key] = client
+
         try:
             yield client
-        finally:
-            client.close()
+        except RedisError:
+            # Do not hand a client in an unknown state to later calls
+            self._clients.pop(key, None)
+            client.connection_pool.disconnect()
+            raise
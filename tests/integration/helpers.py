@@ -3,14 +3,16 @@
 # See LICENSE file for licensing details.
 
 """Helpers for integration tests."""
+import asyncio
+import json
 import logging
 import subprocess
+import time
 from pathlib import Path
 from urllib.request import urlopen
 
 import yaml
 from pytest_operator.plugin import OpsTest
-from tenacity import before_log, retry, stop_after_attempt, wait_fixed
 
 METADATA = yaml.safe_load(Path("./metadata.yaml").read_text())
 APP_NAME = METADATA["name"]
@@ -25,9 +27,13 @@ APPLICATION_DATA = {
     "redis-password": "password",
 }
 NUM_UNITS = 3
+# Seconds a fetched model status is reused by consecutive `get_address` calls
+STATUS_CACHE_TTL = 2.0
 
 logger = logging.getLogger(__name__)
 
+_status_cache = {}
+
 
 async def scale(ops_test: OpsTest, scale: int) -> None:
     """Scale the application to the provided number and wait for idle."""
@@ -89,11 +95,27 @@ async def change_config(ops_test: OpsTest, values: dict) -> None:
 async def get_address(ops_test: OpsTest, app_name=APP_NAME, unit_num=0) -> str:
     """Get the address for a unit."""
     logger.info(f"Getting the address for unit {unit_num}")
-    status = await ops_test.model.get_status()  # noqa: F821
+    status = await _get_status(ops_test)
     address = status["applications"][app_name]["units"][f"{app_name}/{unit_num}"]["address"]
     return address
 
 
+async def _get_status(ops_test: OpsTest):
+    """Get the full model status, reusing a status fetched less than STATUS_CACHE_TTL ago.
+
+    Tests usually get the addresses of several units in a row, and every status fetch
+    pulls the whole model from the controller.
+    """
+    model_uuid = ops_test.model.info.uuid
+    cached = _status_cache.get(model_uuid)
+    if cached and time.monotonic() - cached[0] < STATUS_CACHE_TTL:
+        return cached[1]
+
+    status = await ops_test.model.get_status()
+    _status_cache[model_uuid] = (time.monotonic(), status)
+    return status
+
+
 async def get_unit_map(ops_test: OpsTest) -> dict:
     """Get a map of unit names.
 
@@ -104,8 +126,11 @@ async def get_unit_map(ops_test: OpsTest) -> dict:
         }
     """
     unit_map = {"leader": None, "non_leader": []}
-    for unit in ops_test.model.applications[APP_NAME].units:
-        if await unit.is_leader_from_status():
+    units = ops_test.model.applications[APP_NAME].units
+    # Every check queries the model status, so they are run concurrently
+    leader_flags = await asyncio.gather(*(unit.is_leader_from_status() for unit in units))
+    for unit, is_leader in zip(units, leader_flags):
+        if is_leader:
             # Get the number from the unit
             unit_map["leader"] = unit.name
         else:
@@ -117,20 +142,11 @@ async def get_unit_map(ops_test: OpsTest) -> dict:
 def check_application_status(ops_test: OpsTest, app_name: str) -> str:
     """Return the application status for an app name."""
     model_name = ops_test.model.info.name
-    proc = subprocess.check_output(f"juju status --model={model_name}".split())
-    proc = proc.decode("utf-8")
-
-    statuses = {"active", "maintenance", "waiting", "blocked"}
-    for line in proc.splitlines():
-        parts = line.split()
-        # first line with app name will have application status
-        if parts and parts[0] == app_name:
-            # NOTE: intersects possible statuses with the list of values:
-            # this is done because sometimes version number exists and
-            # sometimes it doesn't on juju status output
-            find_status = list(statuses & set(parts))
-            if find_status:
-                return find_status[0]
+    proc = subprocess.check_output(["juju", "status", f"--model={model_name}", "--format=json"])
+
+    application = json.loads(proc)["applications"].get(app_name)
+    if application:
+        return application["application-status"]["current"]
 
 
 def get_unit_number(unit_name: str) -> str:
@@ -141,15 +157,18 @@ def get_unit_number(unit_name: str) -> str:
     return unit_name.split("/")[1]
 
 
-@retry(
-    stop=stop_after_attempt(3),
-    wait=wait_fixed(5),
-    reraise=True,
-    before=before_log(logger, logging.DEBUG),
-)
 def query_url(url: str):
-    """Connect to a url and return the result."""
-    logger.info("Trying to connect to: {}".format(url))
-    response = urlopen(url)
+    """Connect to a url and return the result.
 
-    return response
+    Errors are retried up to 3 attempts, waiting 5 seconds between them. The last
+    error is raised if every attempt fails.
+    """
+    for attempt in range(1, 4):
+        logger.info("Trying to connect to: {}".format(url))
+        try:
+            return urlopen(url)
+        except Exception as e:
+            if attempt == 3:
+                raise
+            logger.debug(f"Attempt {attempt} to connect to {url} failed: {e}")
+            time.sleep(5)
@@ -2,6 +2,7 @@
 # Copyright 2022 Canonical Ltd.
 # See LICENSE file for licensing details.
 
+import threading
 from unittest import TestCase, mock
 
 from charms.redis_k8s.v0.redis import RedisProvides
@@ -13,7 +14,7 @@ from ops.model import (
     UnknownStatus,
     WaitingStatus,
 )
-from ops.pebble import ServiceInfo
+from ops.pebble import Plan, ServiceInfo
 from ops.testing import Harness
 from redis import Redis
 from redis.exceptions import RedisError
@@ -248,6 +249,29 @@ class TestCharm(TestCase):
         self.assertEqual(rel_data_unit.get("port"), "6379")
         self.assertEqual(rel_data_app.get("leader-host"), self.harness.charm.unit_pod_hostname)
 
+    def test_enable_tls_before_pebble_ready(self):
+        self.harness.set_can_connect("redis", False)
+        self.harness.add_resource("cert-file", "cert")
+        self.harness.add_resource("key-file", "key")
+        self.harness.add_resource("ca-cert-file", "ca")
+
+        self.harness.update_config({"enable-tls": True})
+
+        self.assertIsInstance(self.harness.charm.unit.status, WaitingStatus)
+
+    def test_store_certificates_without_pebble(self):
+        self.harness.set_can_connect("redis", False)
+        self.harness.add_resource("cert-file", "cert")
+        self.harness.add_resource("key-file", "key")
+        self.harness.add_resource("ca-cert-file", "ca")
+        self.harness.update_config({"enable-tls": True})
+        self.harness.set_leader(True)
+
+        # `juju attach-resource` triggers upgrade-charm, maybe before pebble-ready
+        with mock.patch.object(Container, "make_dir") as make_dir:
+            self.harness.charm.on.upgrade_charm.emit()
+        make_dir.assert_not_called()
+
     @mock.patch("charm.RedisK8sCharm._initialize_directory_structure")
     def test_pebble_layer_on_relation_created(self, initialize_directory_structure):
         self.harness.set_leader(True)
@@ -300,6 +324,8 @@ class TestCharm(TestCase):
         self.harness.add_resource("cert-file", "")
         self.harness.add_resource("key-file", "")
         self.harness.add_resource("ca-cert-file", "")
+        # Juju creates a new charm instance per hook, drop the paths cached by the previous one
+        del self.harness.charm._certificates
 
         # After adding them, check that the property returns paths for the three of them
         self.assertTrue(None not in self.harness.charm._certificates)
@@ -520,3 +546,207 @@ class TestCharm(TestCase):
             self.harness.remove_relation_unit(rel.id, "redis-k8s/1")
 
         execute_command.assert_called_with("SENTINEL RESET redis-k8s")
+
+    @mock.patch("socket.getfqdn")
+    def test_unit_pod_hostname(self, getfqdn):
+        self.assertEqual(
+            self.harness.charm.unit_pod_hostname,
+            f"redis-k8s-0.redis-k8s-endpoints.{self.harness.model.name}.svc.cluster.local",
+        )
+        getfqdn.assert_not_called()
+
+    def test_generate_password(self):
+        password = self.harness.charm._generate_password()
+
+        self.assertEqual(len(password), 16)
+        self.assertTrue(password.isalnum())
+        self.assertNotEqual(password, self.harness.charm._generate_password())
+
+    @mock.patch("charm.RedisK8sCharm._initialize_directory_structure")
+    def test_store_certificates(self, _):
+        self.harness.add_resource("cert-file", "cert")
+        self.harness.add_resource("key-file", "key")
+        self.harness.add_resource("ca-cert-file", "ca")
+
+        self.harness.update_config({"enable-tls": True})
+
+        container = self.harness.model.unit.get_container("redis")
+        storage_path = self.harness.charm._storage_path
+        for name, content in [("redis.crt", "cert"), ("redis.key", "key"), ("ca.crt", "ca")]:
+            with container.pull(f"{storage_path}/{name}") as f:
+                self.assertEqual(f.read(), content)
+
+    @mock.patch("charm.RedisK8sCharm._initialize_directory_structure")
+    def test_update_layer_skipped_when_inputs_unchanged(self, _):
+        self.harness.set_leader(True)
+        mock_container = mock.MagicMock(Container)
+
+        def mock_get_container(name):
+            return mock_container
+
+        self.harness.model.unit.get_container = mock_get_container
+        self.harness.charm._update_layer()
+        self.harness.charm._update_layer()
+
+        mock_container.get_plan.assert_called_once()
+        mock_container.add_layer.assert_called_once()
+        self.assertEqual(self.harness.charm.unit.status, ActiveStatus())
+
+    @mock.patch.object(Redis, "execute_command")
+    def test_master_info_flags_are_parsed(self, execute_command):
+        execute_command.return_value = [
+            "ip",
+            APPLICATION_DATA["leader-host"],
+            "flags",
+            "master,s_down",
+        ]
+        self.harness.update_relation_data(
+            self.harness.charm._peers.id, "redis-k8s", APPLICATION_DATA
+        )
+
+        info = self.harness.charm.sentinel.get_master_info()
+        self.assertEqual(info["flags"], {"master", "s_down"})
+        self.assertFalse(self.harness.charm._master_up_to_date())
+
+        execute_command.return_value = ["ip", APPLICATION_DATA["leader-host"], "flags", "master"]
+        self.assertTrue(self.harness.charm._master_up_to_date())
+
+    @mock.patch("charm.RedisK8sCharm._push_certificate")
+    def test_store_certificates_skipped_without_tls(self, _push_certificate):
+        self.harness.add_resource("cert-file", "cert")
+
+        self.harness.charm._store_certificates()
+        _push_certificate.assert_not_called()
+
+    @mock.patch("charm.RedisK8sCharm._initialize_directory_structure")
+    def test_update_layer_skips_plan_when_layer_already_applied(self, _):
+        self.harness.set_leader(True)
+        self.harness.charm._update_layer()
+        self.assertTrue(self.harness.charm._stored.redis_layer_hash)
+
+        # Simulate a later hook, where only the stored layer hash is kept
+        self.harness.charm._last_layer_inputs = None
+        with mock.patch.object(Container, "get_plan") as get_plan:
+            self.harness.charm._update_layer()
+            get_plan.assert_not_called()
+
+        # A pebble-ready event means the plan might be gone, so it is checked again
+        with mock.patch.object(Container, "get_plan", return_value=Plan("")) as get_plan:
+            self.harness.container_pebble_ready("redis")
+            get_plan.assert_called_once()
+
+    def test_redis_extra_flags_replica_with_tls(self):
+        flags = self.harness.charm._redis_extra_flags(
+            password="password",
+            enable_password=True,
+            tls=True,
+            master="leader-host",
+            hostname="replica-host",
+        )
+
+        self.assertTrue(flags.startswith("--requirepass password "))
+        self.assertIn("--replica-announce-ip replica-host", flags)
+        self.assertIn("--tls-port 6379", flags)
+        self.assertTrue(flags.endswith("--replicaof leader-host 6379 --tls-replication yes"))
+
+    @mock.patch.object(Redis, "info")
+    def test_redis_check_without_pebble(self, info):
+        self.harness.set_can_connect("redis", False)
+
+        self.assertFalse(self.harness.charm._redis_check())
+        info.assert_not_called()
+        self.assertEqual(self.harness.charm.unit.status, WaitingStatus("Waiting for Redis..."))
+
+    @mock.patch("time.sleep")
+    @mock.patch("charm.RedisK8sCharm._check_failover_status")
+    def test_is_failover_finished_retries_with_backoff(self, check_failover_status, sleep):
+        check_failover_status.side_effect = [RedisError("down"), RedisError("down"), True]
+
+        self.assertTrue(self.harness.charm._is_failover_finished())
+        self.assertEqual(check_failover_status.call_count, 3)
+        first_wait, second_wait = (c.args[0] for c in sleep.call_args_list)
+        self.assertTrue(0.5 <= first_wait <= 1)
+        self.assertTrue(1 <= second_wait <= 1.5)
+
+        check_failover_status.side_effect = RedisError("down")
+        with self.assertRaises(RedisError):
+            self.harness.charm._is_failover_finished()
+
+    @mock.patch.object(Container, "restart")
+    @mock.patch.object(Redis, "replicaof")
+    @mock.patch("charm.RedisK8sCharm._initialize_directory_structure")
+    def test_master_change_reconfigures_replica_without_restart(self, _, replicaof, restart):
+        rel = self.harness.charm.model.get_relation(self._peer_relation)
+        self.harness.update_relation_data(rel.id, "redis-k8s", APPLICATION_DATA)
+        self.harness.charm._update_layer()
+        restart.assert_called_once_with("redis", "redis_exporter")
+        restart.reset_mock()
+
+        self.harness.update_relation_data(rel.id, "redis-k8s", {"leader-host": "new-leader"})
+        self.harness.charm._update_layer()
+
+        replicaof.assert_called_once_with("new-leader", "6379")
+        restart.assert_not_called()
+        found_plan = self.harness.get_container_pebble_plan("redis").to_dict()
+        self.assertIn("--replicaof new-leader 6379", found_plan["services"]["redis"]["command"])
+
+    @mock.patch.object(Redis, "info")
+    def test_redis_client_dropped_after_error(self, info):
+        info.return_value = {"redis_version": "6.0.11"}
+        self.assertTrue(self.harness.charm._redis_check())
+        self.assertTrue(self.harness.charm._redis_check())
+        self.assertEqual(len(self.harness.charm._redis_clients), 1)
+
+        info.side_effect = RedisError("Error connecting to redis")
+        self.assertFalse(self.harness.charm._redis_check())
+        self.assertEqual(self.harness.charm._redis_clients, {})
+
+    @mock.patch.object(Redis, "execute_command")
+    def test_sentinel_client_reused_and_dropped_after_error(self, execute_command):
+        execute_command.return_value = ["ip", APPLICATION_DATA["leader-host"], "flags", "master"]
+        self.harness.update_relation_data(
+            self.harness.charm._peers.id, "redis-k8s", APPLICATION_DATA
+        )
+        sentinel = self.harness.charm.sentinel
+        sentinel._clients.clear()
+
+        sentinel.get_master_info()
+        sentinel.get_master_info()
+        self.assertEqual(len(sentinel._clients), 1)
+
+        execute_command.side_effect = RedisError("Error connecting to sentinel")
+        with self.assertRaises(RedisError):
+            with sentinel.sentinel_client("0.0.0.0") as client:
+                client.execute_command("SENTINEL CKQUORUM redis-k8s")
+        self.assertEqual(sentinel._clients, {})
+
+    def test_sentinel_layer_not_replanned_when_unchanged(self):
+        self.harness.update_relation_data(
+            self.harness.charm._peers.id, "redis-k8s", APPLICATION_DATA
+        )
+        sentinel = self.harness.charm.sentinel
+
+        sentinel._update_sentinel_layer()
+        plan = self.harness.get_container_pebble_plan("sentinel")
+        self.assertIn("sentinel", plan.services)
+
+        with mock.patch.object(Container, "replan") as replan:
+            sentinel._update_sentinel_layer()
+        replan.assert_not_called()
+
+    @mock.patch.object(Redis, "execute_command")
+    def test_broadcast_reads_sentinel_password_on_main_thread(self, execute_command):
+        self.harness.add_relation_unit(self.harness.charm._peers.id, "redis-k8s/1")
+        password_threads = []
+
+        def get_sentinel_password():
+            password_threads.append(threading.current_thread())
+            return "sentinel-password"
+
+        with mock.patch.object(
+            self.harness.charm, "get_sentinel_password", side_effect=get_sentinel_password
+        ):
+            self.harness.charm._broadcast_sentinel_command("SENTINEL RESET redis-k8s")
+
+        self.assertEqual(execute_command.call_count, 2)
+        self.assertEqual(password_threads, [threading.main_thread()])